@@ -4,37 +4,62 @@
 Скрипт генерации PDF-документов из CSV/JSON данных и HTML-шаблонов.
 """
 
+import argparse
+import codecs
 import csv
+import functools
 import json
 import os
 import platform
+import re
 import subprocess
 import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
 from pathlib import Path
 
-try:
-    import pandas as pd
-    HAS_PANDAS = True
-except ImportError:
-    HAS_PANDAS = False
-
-try:
-    from jinja2 import Environment, FileSystemLoader
-except ImportError:
-    print("Ошибка: требуется jinja2. Установите: pip install jinja2")
-    sys.exit(1)
-
-try:
-    from weasyprint import HTML, CSS
-except ImportError:
-    print("Ошибка: требуется weasyprint. Установите: pip install weasyprint")
-    sys.exit(1)
-
 # Директории проекта
 BASE_DIR = Path(__file__).resolve().parent
 DATA_DIR = BASE_DIR / "data"
 TEMPLATES_DIR = BASE_DIR / "templates"
 OUTPUT_DIR = BASE_DIR / "output"
+JINJA_CACHE_DIR = BASE_DIR / ".jinja_cache"
+
+# Символы, недопустимые в имени PDF (буквы, включая кириллицу, цифры, "-" и "_" сохраняются)
+_UNSAFE_FILENAME_RE = re.compile(r"[^\w-]")
+
+# Возможные имена поля с invoice id (в порядке приоритета)
+_INVOICE_KEYS = ("invoice_id", "invoiceid", "id", "invoiceId", "invoice")
+_MISSING = object()
+
+# Числовые фрагменты invoice id для «естественной» сортировки (INV-2 < INV-10)
+_DIGITS_RE = re.compile(r"(\d+)")
+
+# <link ... data-print="no"> — экранные стили, которые не нужны при генерации PDF
+_SCREEN_ONLY_LINK_RE = re.compile(r"""<link[^>]+data-print=["']no["'][^>]*>""", re.I)
+
+# CSS для поддержки кириллицы (DejaVu Sans)
+_CSS_SOURCE = """
+    @page {
+        size: A4;
+        margin: 2cm;
+    }
+    body {
+        font-family: "DejaVu Sans", "Liberation Sans", sans-serif;
+        font-size: 12px;
+    }
+"""
+
+# jinja2 и weasyprint импортируются лениво (см. _init_renderer), чтобы меню
+# появлялось сразу. Окружение Jinja2 и CSS создаются один раз за процесс.
+_ENV = None
+_HTML = None
+_CSS_CUSTOM = None
+_FONTS = None
+
+# Общий кэш изображений WeasyPrint: повторяющиеся логотипы и SVG
+# декодируются один раз за процесс.
+_IMAGE_CACHE = {}
 
 
 def ensure_directories():
@@ -44,32 +69,49 @@ def ensure_directories():
     OUTPUT_DIR.mkdir(exist_ok=True)
 
 
+@functools.lru_cache(maxsize=None)
+def _scan(directory, exts):
+    """Возвращает отсортированные файлы директории с указанными расширениями.
+
+    os.scandir отдаёт тип файла без отдельного stat на каждую запись;
+    результат кэшируется на время работы процесса.
+    """
+    try:
+        with os.scandir(directory) as it:
+            return tuple(sorted(
+                Path(entry.path) for entry in it
+                if entry.is_file() and entry.name.lower().endswith(exts)
+            ))
+    except FileNotFoundError:
+        return ()
+
+
 def get_data_files():
     """Возвращает списки CSV и JSON файлов из директории data."""
-    csv_files = sorted(DATA_DIR.glob("*.csv"))
-    json_files = sorted(DATA_DIR.glob("*.json"))
-    return list(csv_files), list(json_files)
+    files = _scan(DATA_DIR, (".csv", ".json"))
+    csv_files = [f for f in files if f.suffix.lower() == ".csv"]
+    json_files = [f for f in files if f.suffix.lower() == ".json"]
+    return csv_files, json_files
 
 
 def get_templates():
     """Возвращает список HTML-шаблонов из директории templates."""
-    return sorted(TEMPLATES_DIR.glob("*.html"))
+    return list(_scan(TEMPLATES_DIR, (".html",)))
 
 
 def parse_csv(filepath):
-    """Парсит CSV с помощью pandas (если доступен) или csv."""
-    with open(filepath, "r", encoding="utf-8-sig") as f:
-        if HAS_PANDAS:
-            df = pd.read_csv(f)
-            return df.to_dict(orient="records")
-        reader = csv.DictReader(f)
-        return list(reader)
+    """Лениво парсит CSV стандартной библиотекой (генератор строк)."""
+    with open(filepath, "r", encoding="utf-8-sig", newline="") as f:
+        yield from csv.DictReader(f)
 
 
 def parse_json(filepath):
     """Парсит JSON стандартной библиотекой."""
-    with open(filepath, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    # json.loads разбирает bytes целиком C-ускорителем. orjson не используется:
+    # он молча превращает целые больше 64 бит в float и не принимает NaN/Infinity.
+    # BOM (например, из «Блокнота» Windows) убирается, как utf-8-sig в parse_csv
+    raw = filepath.read_bytes().removeprefix(codecs.BOM_UTF8)
+    data = json.loads(raw)
     # Поддержка разных структур: список или {"invoices": [...]}
     if isinstance(data, list):
         return data
@@ -82,7 +124,7 @@ def parse_json(filepath):
 
 
 def load_data(filepath):
-    """Загружает данные из CSV или JSON файла."""
+    """Загружает данные из CSV (генератор) или JSON (список) файла."""
     suffix = filepath.suffix.lower()
     if suffix == ".csv":
         return parse_csv(filepath)
@@ -91,30 +133,54 @@ def load_data(filepath):
     raise ValueError(f"Неподдерживаемый формат: {suffix}")
 
 
+@functools.lru_cache(maxsize=4096)
+def _natural_key(value):
+    """Ключ естественной сортировки: числа внутри строки сравниваются как числа."""
+    # После split по группе числа всегда стоят на нечётных позициях
+    return tuple(
+        int(part) if i % 2 else part
+        for i, part in enumerate(_DIGITS_RE.split(value))
+    )
+
+
 def extract_invoice_id(item):
     """Извлекает invoice id из записи (поддержка разных имён полей)."""
-    for key in ("invoice_id", "invoiceid", "id", "invoiceId", "invoice"):
-        if isinstance(item, dict) and key in item:
-            return str(item[key])
+    if not isinstance(item, dict):
+        return None
+    for key in _INVOICE_KEYS:
+        value = item.get(key, _MISSING)
+        if value is not _MISSING:
+            return str(value)
     return None
 
 
-def get_invoices_map(data):
-    """Возвращает словарь {invoice_id: item} и список id для выбора."""
+def get_invoices_map(data, target_id=None):
+    """Возвращает словарь {invoice_id: item} и список id для выбора.
+
+    data может быть любым итерируемым объектом, в том числе генератором.
+    Если задан target_id, возвращается только первая запись с этим id
+    (или меткой), а оставшиеся записи не читаются; если такой записи нет —
+    пустой словарь.
+    """
     invoices = {}
     for i, item in enumerate(data):
         inv_id = extract_invoice_id(item)
-        if inv_id and inv_id not in invoices:
-            invoices[inv_id] = item
-        elif not inv_id:
+        if inv_id:
+            key = inv_id
+        else:
             # Нет invoice_id — используем индекс и описание (product, name и т.д.)
             idx = str(i + 1)
             if isinstance(item, dict):
                 desc = item.get("product") or item.get("name") or item.get("title") or ""
-                label = f"{idx} — {desc}" if desc else idx
+                key = f"{idx} — {desc}" if desc else idx
             else:
-                label = idx
-            invoices[label] = item
+                key = idx
+
+        if target_id is not None:
+            if key == target_id:
+                return {key: item}
+        elif key not in invoices:
+            invoices[key] = item
     return invoices
 
 
@@ -134,40 +200,293 @@ def open_pdf(filepath):
         print(f"Файл сохранён: {path}")
 
 
+def _init_renderer():
+    """Импортирует jinja2 и weasyprint и создаёт общие объекты при первом вызове."""
+    global _ENV, _HTML, _CSS_CUSTOM, _FONTS
+
+    if _HTML is None:
+        try:
+            from weasyprint import HTML, CSS
+            from weasyprint.text.fonts import FontConfiguration
+        except ImportError:
+            print("Ошибка: требуется weasyprint. Установите: pip install weasyprint")
+            sys.exit(1)
+
+        # Общая конфигурация шрифтов: загруженные шрифты переиспользуются между PDF
+        _FONTS = FontConfiguration()
+        _CSS_CUSTOM = CSS(string=_CSS_SOURCE, font_config=_FONTS)
+        _HTML = HTML
+
+    if _ENV is None:
+        try:
+            from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+        except ImportError:
+            print("Ошибка: требуется jinja2. Установите: pip install jinja2")
+            sys.exit(1)
+
+        class _OptionalBytecodeCache(FileSystemBytecodeCache):
+            """Кэш байткода, ошибки чтения/записи которого не мешают рендеру."""
+
+            def load_bytecode(self, bucket):
+                try:
+                    super().load_bytecode(bucket)
+                except OSError:
+                    pass
+
+            def dump_bytecode(self, bucket):
+                try:
+                    super().dump_bytecode(bucket)
+                except OSError:
+                    pass
+
+        # Скомпилированные шаблоны кэшируются в памяти и, в виде байткода, на диске:
+        # следующие запуски скрипта пропускают разбор и компиляцию шаблонов.
+        # Байткод привязан к контрольной сумме исходника, правки шаблона подхватываются.
+        # Если директория скрипта недоступна для записи, работаем без дискового кэша.
+        try:
+            JINJA_CACHE_DIR.mkdir(exist_ok=True)
+            bytecode_cache = _OptionalBytecodeCache(str(JINJA_CACHE_DIR))
+        except OSError:
+            bytecode_cache = None
+
+        _ENV = Environment(
+            loader=FileSystemLoader(str(TEMPLATES_DIR)),
+            autoescape=True,
+            auto_reload=False,
+            cache_size=-1,
+            bytecode_cache=bytecode_cache,
+        )
+
+
+def _write_file(path, content):
+    """Записывает готовый PDF (bytes) в файл минимальным числом системных вызовов."""
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+    fd = os.open(str(path), flags, 0o644)
+    try:
+        view = memoryview(content)
+        # os.write может записать не всё за один вызов
+        while view:
+            written = os.write(fd, view)
+            view = view[written:]
+    finally:
+        os.close(fd)
+
+
+def _render_html(template, data):
+    """Рендерит шаблон и убирает ссылки на стили с data-print="no"."""
+    return _SCREEN_ONLY_LINK_RE.sub("", template.render(**data))
+
+
 def render_pdf(template_path, data, output_path):
     """Генерирует PDF из HTML-шаблона с подстановкой данных."""
-    env = Environment(
-        loader=FileSystemLoader(str(TEMPLATES_DIR)),
-        autoescape=True,
+    _init_renderer()
+    template = _ENV.get_template(template_path.name)
+    html_content = _render_html(template, data)
+
+    html_obj = _HTML(string=html_content, base_url=str(TEMPLATES_DIR))
+    # PDF собирается в памяти и записывается на диск одним блоком
+    content = html_obj.write_pdf(
+        stylesheets=[_CSS_CUSTOM],
+        font_config=_FONTS,
+        optimize_images=True,
+        cache=_IMAGE_CACHE,
+    )
+    _write_file(output_path, content)
+
+
+def render_pdfs_batch(template_path, list_of_data, output_paths):
+    """Генерирует несколько PDF за один проход WeasyPrint.
+
+    Все чеки склеиваются в один HTML с разрывами страниц, вёрстка выполняется
+    один раз, после чего документ делится на отдельные файлы по меткам начала
+    каждого чека.
+
+    Результат не всегда совпадает с отдельной генерацией каждого чека:
+    счётчики counter(page)/counter(pages) и правила @page :first считаются
+    по всему пакету, все PDF получают <title> первого чека, а повторяющиеся
+    id элементов ломают ссылки #fragment. Для таких шаблонов используйте
+    render_many (--jobs N) или render_pdf.
+    """
+    _init_renderer()
+    template = _ENV.get_template(template_path.name)
+    # Каждый чек — в собственном контейнере с разрывом страницы перед ним.
+    # Пустой комментарий <!----> перед тегами контейнера «принимает на себя»
+    # незакрытый тег в конце шаблона (например, "</html" без ">"): иначе тот
+    # проглотит </div>, и контейнеры окажутся вложены друг в друга.
+    parts = []
+    for i, data in enumerate(list_of_data):
+        style = ' style="break-before: page"' if i else ""
+        parts.append(f'<!----><div id="_batch_{i}"{style}>')
+        parts.append(_render_html(template, data))
+        parts.append("<!----></div>")
+
+    html_obj = _HTML(string="\n".join(parts), base_url=str(TEMPLATES_DIR))
+    document = html_obj.render(
+        stylesheets=[_CSS_CUSTOM],
+        font_config=_FONTS,
+        optimize_images=True,
+        cache=_IMAGE_CACHE,
     )
-    template = env.get_template(template_path.name)
-    html_content = template.render(**data)
 
-    # CSS для поддержки кириллицы (DejaVu Sans)
-    css_custom = CSS(string="""
-        @page {
-            size: A4;
-            margin: 2cm;
-        }
-        body {
-            font-family: "DejaVu Sans", "Liberation Sans", sans-serif;
-            font-size: 12px;
-        }
-    """)
+    # Номер первой страницы каждого чека
+    starts = []
+    for i in range(len(list_of_data)):
+        marker = f"_batch_{i}"
+        start = next(
+            (n for n, page in enumerate(document.pages) if marker in page.anchors),
+            None,
+        )
+        if start is None:
+            raise ValueError(
+                f"пакетная генерация: не найдена метка начала чека №{i + 1} "
+                f"в свёрстанном документе (шаблон {template_path.name})"
+            )
+        starts.append(start)
+
+    # Чеки не разделились по страницам — рендерим каждый отдельно
+    if any(a >= b for a, b in zip(starts, starts[1:])):
+        for data, output_path in zip(list_of_data, output_paths):
+            render_pdf(template_path, data, output_path)
+        return
+
+    ends = starts[1:] + [len(document.pages)]
+
+    # Запись на диск идёт в фоновых потоках, пока сериализуется следующий PDF
+    with ThreadPoolExecutor(max_workers=4) as writer:
+        futures = [
+            writer.submit(
+                _write_file,
+                output_path,
+                document.copy(document.pages[start:end]).write_pdf(),
+            )
+            for start, end, output_path in zip(starts, ends, output_paths)
+        ]
+    for future in futures:
+        future.result()
+
+
+def _init_worker(template_name):
+    """Инициализатор процесса-воркера: загружает зависимости и компилирует шаблон."""
+    _init_renderer()
+    _ENV.get_template(template_name)
+
+
+def render_many(template_path, datas, output_paths, max_workers=None):
+    """Генерирует несколько PDF параллельно в пуле процессов.
+
+    Вёрстка WeasyPrint нагружает CPU, поэтому независимые чеки
+    распределяются по процессам (по умолчанию не более 4).
+    """
+    if max_workers is None:
+        max_workers = min(os.cpu_count() or 1, 4)
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_worker,
+        initargs=(template_path.name,),
+    ) as executor:
+        # list() нужен, чтобы исключения из воркеров дошли до вызывающего
+        list(executor.map(render_pdf, repeat(template_path), datas, output_paths))
+
+
+def build_template_data(invoice_id, invoice_data):
+    """Готовит словарь для подстановки в шаблон."""
+    # Преобразуем данные для шаблона: flat dict
+    if isinstance(invoice_data, dict):
+        template_data = dict(invoice_data)
+    else:
+        template_data = {"data": invoice_data}
+
+    # Добавляем invoice_id на случай, если его не было
+    template_data.setdefault("invoice_id", invoice_id)
+
+    # Для универсального шаблона: список пар (ключ, значение)
+    if isinstance(invoice_data, dict):
+        template_data["_invoice_items"] = list(invoice_data.items())
+
+    return template_data
+
+
+def get_output_path(invoice_id, output_dir=OUTPUT_DIR):
+    """Возвращает путь к PDF для указанного invoice id."""
+    safe_id = _UNSAFE_FILENAME_RE.sub("_", invoice_id)
+    return output_dir / f"invoice_{safe_id}.pdf"
+
+
+def get_output_paths(invoice_ids, output_dir=OUTPUT_DIR):
+    """Возвращает различающиеся пути к PDF для списка invoice id.
+
+    Разные id могут дать одно имя файла (INV/1 и INV 1 → invoice_INV_1.pdf),
+    поэтому к повторам добавляется номер: invoice_INV_1_2.pdf. Имена
+    сравниваются без учёта регистра — как в файловых системах Windows и macOS.
+    """
+    paths = []
+    used = set()
+    for invoice_id in invoice_ids:
+        base = path = get_output_path(invoice_id, output_dir)
+        n = 2
+        while path.name.lower() in used:
+            path = base.with_name(f"{base.stem}_{n}.pdf")
+            n += 1
+        used.add(path.name.lower())
+        paths.append(path)
+    return paths
+
+
+def generate_one(template_file, invoice_id, invoice_data, output_dir, open_result=True):
+    """Генерирует PDF для одного чека. Возвращает код выхода."""
+    template_data = build_template_data(invoice_id, invoice_data)
+    output_path = get_output_path(invoice_id, output_dir)
 
-    html_obj = HTML(string=html_content, base_url=str(TEMPLATES_DIR))
-    html_obj.write_pdf(output_path, stylesheets=[css_custom])
+    try:
+        render_pdf(template_file, template_data, output_path)
+    except Exception as e:
+        print(f"Ошибка генерации PDF: {e}")
+        return 1
+    print(f"\n  PDF успешно создан: {output_path}")
+    if open_result:
+        open_pdf(output_path)
+    return 0
+
+
+def generate_all(template_file, invoices_map, output_dir, jobs=1):
+    """Генерирует PDF для всех чеков. Возвращает код выхода.
+
+    При jobs == 1 все чеки верстаются за один проход WeasyPrint,
+    иначе распределяются по jobs процессам.
+    """
+    invoice_ids = sorted(invoices_map, key=_natural_key)
+    list_of_data = [
+        build_template_data(inv_id, invoices_map[inv_id]) for inv_id in invoice_ids
+    ]
+    output_paths = get_output_paths(invoice_ids, output_dir)
+
+    try:
+        if jobs > 1:
+            render_many(template_file, list_of_data, output_paths, max_workers=jobs)
+        else:
+            render_pdfs_batch(template_file, list_of_data, output_paths)
+    except Exception as e:
+        print(f"Ошибка генерации PDF: {e}")
+        return 1
+    print(f"\n  Создано PDF: {len(output_paths)} в {output_dir}")
+    return 0
+
+
+def _numbered(items):
+    """Возвращает строки нумерованного списка для меню."""
+    return [f"  {i}. {item}" for i, item in enumerate(items, 1)]
 
 
 def select_from_list(items, prompt, item_label="элемент"):
     """Интерактивный выбор элемента из списка. Возвращает индекс или None."""
     if not items:
         return None
-    print(f"\n{prompt}")
-    print("-" * 40)
-    for i, item in enumerate(items, 1):
-        print(f"  {i}. {item}")
-    print("-" * 40)
+    # Меню собирается целиком и выводится одной записью
+    lines = [f"\n{prompt}", "-" * 40]
+    lines.extend(_numbered(items))
+    lines.append("-" * 40)
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.stdout.flush()
     while True:
         try:
             choice = input(f"Введите номер (1-{len(items)}) или 0 для выхода: ").strip()
@@ -181,7 +500,114 @@ def select_from_list(items, prompt, item_label="элемент"):
         print("Неверный ввод. Попробуйте снова.")
 
 
-def main():
+def parse_args(argv=None):
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(
+        description="Генерация PDF из CSV/JSON данных и HTML-шаблонов. "
+                    "Без --data запускается интерактивный режим.",
+    )
+    parser.add_argument(
+        "--data",
+        help="файл с данными (путь или имя файла в data/)",
+    )
+    parser.add_argument(
+        "--template",
+        help="HTML-шаблон (имя файла в templates/)",
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--invoice-id",
+        help="invoice id (или метка записи) чека для генерации",
+    )
+    mode.add_argument(
+        "--batch",
+        action="store_true",
+        help="сгенерировать PDF для всех чеков из файла",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="число процессов для пакетной генерации (по умолчанию 1 — один проход WeasyPrint)",
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        default=OUTPUT_DIR,
+        help="директория для PDF (по умолчанию output/)",
+    )
+    args = parser.parse_args(argv)
+
+    if args.jobs < 1:
+        parser.error("--jobs должен быть не меньше 1")
+    if args.data is None:
+        if args.template or args.invoice_id is not None or args.batch:
+            parser.error("--template, --invoice-id и --batch требуют --data")
+    else:
+        if not args.template:
+            parser.error("с --data необходимо указать --template")
+        if args.invoice_id is None and not args.batch:
+            parser.error("с --data необходимо указать --invoice-id или --batch")
+    return args
+
+
+def prepare_output_dir(output_dir):
+    """Создаёт директорию для PDF. Возвращает False, если это не удалось."""
+    try:
+        output_dir.mkdir(parents=True, exist_ok=True)
+    except OSError as e:
+        print(f"Ошибка: не удалось создать директорию для PDF {output_dir}: {e}")
+        return False
+    return True
+
+
+def run_non_interactive(args):
+    """Генерация PDF по аргументам командной строки, без вопросов пользователю."""
+    data_file = Path(args.data)
+    if not data_file.is_file():
+        data_file = DATA_DIR / args.data
+    if not data_file.is_file():
+        print(f"Ошибка: файл с данными не найден: {args.data}")
+        return 1
+
+    # Шаблоны загружаются Jinja2 из директории templates по имени файла
+    template_file = TEMPLATES_DIR / Path(args.template).name
+    if not template_file.is_file():
+        print(f"Ошибка: шаблон не найден в {TEMPLATES_DIR}: {args.template}")
+        return 1
+
+    if not prepare_output_dir(args.output_dir):
+        return 1
+
+    try:
+        invoices_map = get_invoices_map(load_data(data_file), target_id=args.invoice_id)
+    except Exception as e:
+        print(f"Ошибка чтения файла {data_file.name}: {e}")
+        return 1
+
+    if args.invoice_id is not None:
+        if not invoices_map:
+            print(f"Ошибка: чек {args.invoice_id} не найден в {data_file.name}")
+            return 1
+        return generate_one(
+            template_file, args.invoice_id, invoices_map[args.invoice_id],
+            args.output_dir, open_result=False,
+        )
+
+    if not invoices_map:
+        print("Файл данных пуст или не содержит записей.")
+        return 1
+    return generate_all(template_file, invoices_map, args.output_dir, args.jobs)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # Неинтерактивный режим ничего не создаёт рядом со скриптом: нужна только
+    # директория для PDF, её создаёт prepare_output_dir.
+    if args.data is not None:
+        return run_non_interactive(args)
+
     ensure_directories()
 
     csv_files, json_files = get_data_files()
@@ -197,18 +623,19 @@ def main():
         return 1
 
     # Вывод списка файлов и шаблонов
-    print("\n" + "=" * 50)
-    print("  Генератор PDF из данных и шаблонов")
-    print("=" * 50)
-    print("\n  Доступные файлы с данными:")
-    print("-" * 40)
-    for i, f in enumerate(data_files, 1):
-        print(f"  {i}. {f.name}")
-    print("\n  Доступные HTML-шаблоны:")
-    print("-" * 40)
-    for i, t in enumerate(templates, 1):
-        print(f"  {i}. {t.name}")
-    print("=" * 50)
+    lines = [
+        "\n" + "=" * 50,
+        "  Генератор PDF из данных и шаблонов",
+        "=" * 50,
+        "\n  Доступные файлы с данными:",
+        "-" * 40,
+        *_numbered(f.name for f in data_files),
+        "\n  Доступные HTML-шаблоны:",
+        "-" * 40,
+        *_numbered(t.name for t in templates),
+        "=" * 50,
+    ]
+    sys.stdout.write("\n".join(lines) + "\n")
 
     # Выбор файла данных
     data_idx = select_from_list(
@@ -233,26 +660,21 @@ def main():
     data_file = data_files[data_idx]
     template_file = templates[template_idx]
 
-    # Загрузка данных
+    # Загрузка данных и построение карты чеков по invoice id.
+    # CSV читается потоково, поэтому ошибки разбора возникают при обходе.
     try:
-        data = load_data(data_file)
+        invoices_map = get_invoices_map(load_data(data_file))
     except Exception as e:
         print(f"Ошибка чтения файла {data_file.name}: {e}")
         return 1
 
-    if not data:
-        print("Файл данных пуст или не содержит записей.")
-        return 1
-
-    # Построение карты чеков по invoice id
-    invoices_map = get_invoices_map(data)
     if not invoices_map:
-        print("Не найдено записей с полем invoice_id (или id, invoiceId).")
+        print("Файл данных пуст или не содержит записей.")
         return 1
 
-    invoice_ids = sorted(invoices_map.keys())
+    invoice_ids = sorted(invoices_map, key=_natural_key)
     inv_idx = select_from_list(
-        invoice_ids,
+        invoice_ids + ["Все чеки (пакетная генерация)"],
         "Выберите invoice id (чек) для генерации PDF:",
         "чек"
     )
@@ -260,35 +682,17 @@ def main():
         print("Выход.")
         return 0
 
-    invoice_id = invoice_ids[inv_idx]
-    invoice_data = invoices_map[invoice_id]
-
-    # Преобразуем данные для шаблона: flat dict
-    if isinstance(invoice_data, dict):
-        template_data = {k: v for k, v in invoice_data.items()}
-    else:
-        template_data = {"data": invoice_data}
-
-    # Добавляем invoice_id на случай, если его не было
-    template_data.setdefault("invoice_id", invoice_id)
-
-    # Для универсального шаблона: список пар (ключ, значение)
-    if isinstance(invoice_data, dict):
-        template_data["_invoice_items"] = [(k, v) for k, v in invoice_data.items()]
+    if not prepare_output_dir(args.output_dir):
+        return 1
 
-    # Генерация PDF
-    safe_id = "".join(c if c.isalnum() or c in "-_" else "_" for c in invoice_id)
-    output_filename = f"invoice_{safe_id}.pdf"
-    output_path = OUTPUT_DIR / output_filename
+    # Последний пункт меню — пакетная генерация всех чеков
+    if inv_idx == len(invoice_ids):
+        return generate_all(template_file, invoices_map, args.output_dir, args.jobs)
 
-    try:
-        render_pdf(template_file, template_data, output_path)
-        print(f"\n  PDF успешно создан: {output_path}")
-        open_pdf(output_path)
-        return 0
-    except Exception as e:
-        print(f"Ошибка генерации PDF: {e}")
-        return 1
+    invoice_id = invoice_ids[inv_idx]
+    return generate_one(
+        template_file, invoice_id, invoices_map[invoice_id], args.output_dir,
+    )
 
 
 if __name__ == "__main__":